@@ -1,9 +1,18 @@
 #!/usr/bin/env python3
 
+import atexit
+import collections
+import concurrent.futures
+import functools
+import hashlib
+import heapq
 import json
 import os
+import pickle
+import queue
 import re
 import resource
+import shutil
 import subprocess
 import sys
 import time
@@ -15,10 +24,15 @@ from classify import classify
 def eprint(*args, **kwargs):
     print(*args, file=sys.stderr, **kwargs)
 
+@functools.lru_cache(maxsize=None)
+def find_executable(name):
+    return shutil.which(name) or name
+
 class Baker:
     args_nature = {
         'help': 0,
         'release': 0,
+        'jobs': 1,
         'run': 1,
         'show': 0,
         'rebuild': 0,
@@ -30,6 +44,11 @@ class Baker:
         'nocatch': 0
     }
 
+    # Flags whose value is a path; a relative one would break once a batch runs in the object directory
+    path_flags = ['-I', '-iquote', '-isystem', '-idirafter', '-include', '-imacros', '-isysroot', '--sysroot',
+                  '-L', '-B', '-fmodule-file', '-fprebuilt-module-path', '-fmodules-cache-path', '-fmodule-map-file',
+                  '-fprofile-use', '-fprofile-instr-use', '-fsanitize-ignorelist']
+
     options_default = {
         'dirs': {
             'source': 'src',
@@ -50,6 +69,7 @@ class Baker:
     def __init__(self):
         self.load_bakerfile()
         self.handle_args()
+        self.load_caches()
         self.make_targets()
 
         if 'maxrss' in self.args:
@@ -62,27 +82,25 @@ class Baker:
 
     def make_targets(self):
         targets = self.options['targets']
-        if type(targets) != dict:
-            raise ValueError(f'Targets must be a dict: {targets}')
 
         for target in targets:
             sources = targets[target]
-            if type(sources) != list:
-                raise ValueError(f'Source of each target must be a list (of strings): {targets}')
 
             begin = time.time()
-            self.gen_classes(sources)
+            if not self.load_graph(target, sources):
+                self.gen_classes(sources)
+                self.build_dependency_tree()
+                self.save_graph(target)
             self.make_directories()
             self.make_header_units()
-            self.build_dependency_tree()
             if 'deptree' in self.args:
                 print(f'{target}:')
-                self.walk(self.root_node, 0)
+                self.walk(self.root_node)
             else:
                 self.build_compile_tree()
                 if 'tree' in self.args:
                     print(f'{target}:')
-                    self.walk(self.root_node, 0)
+                    self.walk(self.root_node)
                 else:
                     self.compile_all()
                     self.link(target)
@@ -99,70 +117,210 @@ class Baker:
 
     def compile_all(self):
         self.compiles = 0
-        triggered_recompile = self.rebuild
-        triggered_recompile_next = False
-
-        node = self.last_node
-        siblings_left = node.parent.children.copy() if node.parent is not None else None
-
-        while True:
-            raw_source = node.data['filename']
-
-            source = os.path.join(self.options['dirs']['source'], raw_source)
-            target = os.path.join(self.dirs['object'], self.removesuffixes(['.cpp', '.cppm'], raw_source) + '.o')
-
-            is_module = node.data['type'] in [Type.module, Type.module_partition]
-            bmi_target = target.removesuffix('.o') + '.pcm'
-
-            if triggered_recompile or (not os.path.exists(target) or self.is_later(source, target)) \
-               or (is_module and (not os.path.exists(bmi_target) or self.is_later(source, bmi_target))):
-
-                if not self.show:
-                    eprint(f'> Compiling {raw_source}...', end='', flush=True)
-                begin = time.time()
-                self.compile(source, target, node)
-                elapsed = time.time() - begin
-                if not self.show:
-                    eprint('\r', end='')
-                eprint('> Compiled', raw_source, 'in', f'{elapsed:.2e}s')
-
-                self.compiles += 1
-                triggered_recompile_next = True
-
-            if id(node) == id(self.root_node):
-                break
-
-            siblings_left.remove(node)
-            if len(siblings_left) > 0:
-                node = siblings_left[0]
+        self.fingerprints = {}
+        self.node_flags = {}
+        self.module_flags = {}
+        self.in_degree_left = self.in_degree.copy()
+        self.triggered = set(self.in_degree) if self.rebuild else set()
+        self.fill_priorities()
+        self.ready = []
+        for node in self.in_degree:
+            if self.in_degree[node] == 0:
+                self.push_ready(node)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            running = {}
+            # Fed by done callbacks, so each completion is one get() instead of wait() re-arming every running future
+            completed = queue.SimpleQueue()
+            outdated = []
+            while len(self.ready) > 0 or len(outdated) > 0 or len(running) > 0:
+                while len(self.ready) > 0:
+                    entry = heapq.heappop(self.ready)
+                    if entry[-1] in self.triggered or self.is_outdated(entry[-1]):
+                        heapq.heappush(outdated, entry)
+                    else:
+                        self.release(entry[-1], False)
+
+                # Only fill free workers so a long pole that becomes ready later isn't queued behind short jobs
+                free = self.jobs - len(running)
+                batches = self.group_compilable([heapq.heappop(outdated)[-1] for _ in range(len(outdated))])
+                for batch in batches[:free]:
+                    future = executor.submit(self.compile_batch, batch)
+                    running[future] = batch
+                    future.add_done_callback(completed.put)
+                for batch in batches[free:]:
+                    for node in batch:
+                        heapq.heappush(outdated, (-self.priorities[node], id(node), node))
+
+                if len(running) > 0:
+                    future = completed.get()
+                    batch = running.pop(future)
+                    if future.exception() is not None:
+                        for pending in running:
+                            pending.cancel()
+                        raise future.exception()
+                    self.compiles += len(batch)
+                    for node in batch:
+                        self.record_compile_time(node, future.result() / len(batch))
+                        self.hash_cache[self.object_paths(node)[1]] = self.fingerprint(node)
+                        self.release(node, True)
+
+    def fill_priorities(self):
+        times = self.compile_times.values()
+        self.default_cost = sum(times) / len(times) if len(times) > 0 else 1.0
+        self.priorities = {}
+        expanding = set()
+
+        # Cost of the longest chain of dependents still waiting on each node, the node itself included
+        for start in self.in_degree:
+            stack = [start]
+            while len(stack) > 0:
+                node = stack[-1]
+                if node in self.priorities:
+                    stack.pop()
+                    continue
+                pending = [dependent for dependent in self.dependents[node] if dependent not in self.priorities]
+                if len(pending) > 0 and node not in expanding:
+                    expanding.add(node)
+                    for dependent in pending:
+                        if dependent in expanding:
+                            raise RuntimeError(f'Import cycle through {dependent.filename}')
+                    stack.extend(pending)
+                    continue
+                stack.pop()
+                expanding.discard(node)
+                self.priorities[node] = self.cost(node) + max((self.priorities[dependent] for dependent in self.dependents[node]),
+                                                                  default=0)
+
+    def cost(self, node):
+        return self.compile_times.get(node.filename, self.default_cost)
+
+    def record_compile_time(self, node, elapsed):
+        filename = node.filename
+        if filename in self.compile_times:
+            elapsed = 0.5 * elapsed + 0.5 * self.compile_times[filename]
+        self.compile_times[filename] = elapsed
+
+    def push_ready(self, node):
+        heapq.heappush(self.ready, (-self.priorities[node], id(node), node))
+
+    def group_compilable(self, nodes):
+        batches = []
+        groups = {}
+
+        for node in nodes:
+            # Modules and partitions each emit their own BMI, so only sources producing nothing but an object can share an invocation
+            if not self.batchable or node.type in [Type.module, Type.module_partition]:
+                batches += [[node]]
             else:
-                if triggered_recompile_next:
-                    triggered_recompile = True
-                node = node.parent
-                siblings_left = node.parent.children.copy() if node.parent is not None else None
+                key = (os.path.dirname(node.filename), tuple(self.extra_flags(node)))
+                groups.setdefault(key, []).append(node)
+
+        for group in groups.values():
+            # Longest processing time first: each source goes to the currently cheapest batch
+            bins = [[0, []] for _ in range(min(self.jobs, len(group)))]
+            for node in sorted(group, key=self.cost, reverse=True):
+                cheapest = min(bins, key=lambda entry: entry[0])
+                cheapest[0] += self.cost(node)
+                cheapest[1] += [node]
+            batches += [nodes for _, nodes in bins]
+
+        batches.sort(key=lambda batch: max(self.priorities[node] for node in batch), reverse=True)
+        return batches
+
+    def release(self, node, compiled):
+        for dependent in self.dependents[node]:
+            self.in_degree_left[dependent] -= 1
+            if compiled:
+                self.triggered.add(dependent)
+            if self.in_degree_left[dependent] == 0:
+                self.push_ready(dependent)
+
+    def is_outdated(self, node):
+        target = self.object_paths(node)[1]
+        if not self.exists(target):
+            return True
+
+        if node.type in [Type.module, Type.module_partition]:
+            if not self.exists(os.path.join(self.dirs['object'], node.bmi_name)):
+                return True
+
+        return self.fingerprint(node) != self.hash_cache.get(target)
+
+    def fingerprint(self, node):
+        if node not in self.fingerprints:
+            digest = hashlib.blake2b(digest_size=8)
+            digest.update(' '.join(self.cmd_prefix).encode())
+            with open(self.object_paths(node)[0], 'rb') as file:
+                digest.update(file.read())
+            for fingerprint in sorted(self.fingerprint(dependency) for dependency in self.dependencies[node]):
+                digest.update(fingerprint.encode())
+            self.fingerprints[node] = digest.hexdigest()
+        return self.fingerprints[node]
+
+    def object_paths(self, node):
+        source = os.path.join(self.options['dirs']['source'], node.filename)
+        target = os.path.join(self.dirs['object'], node.object_name)
+        return source, target
+
+    def compile_batch(self, batch):
+        begin = time.time()
+        if len(batch) == 1:
+            source, target = self.object_paths(batch[0])
+            self.compile(source, target, batch[0])
+        else:
+            self.compile_many(batch)
+        elapsed = time.time() - begin
+        eprint('> Compiled', ', '.join(node.filename for node in batch), 'in', f'{elapsed:.2e}s')
+        return elapsed
 
     def compile(self, source, target, node):
-        extra_flags = []
-
-        for header in node.data['header_units']:
-            bmi_path = os.path.join(self.dirs['header_units'], header.replace('/', '-')) + '.pcm'
-            extra_flags += ['-fmodule-file=' + bmi_path]
-
-        collected = []
-        self.collect_modules(node, collected)
-        for s_module, s_bmi_path in collected:
-            extra_flags += ['-fmodule-file=' + s_module + '=' + s_bmi_path]
-
-        self.run(self.cxx + self.base_flags + self.type_flags + extra_flags + ['-fmodule-output', '-c', source, '-o', target])
-
-    def collect_modules(self, node, collected):
-        if node.data['type'] in [Type.module, Type.module_partition]:
-            filename = node.data['filename']
-            bmi_path = os.path.join(self.dirs['object'], filename.removesuffix('.cppm') + '.pcm')
-            collected += [(node.data['module'], bmi_path)]
-
-        for child in node.children:
-            self.collect_modules(child, collected)
+        self.run([*self.cmd_prefix, *self.extra_flags(node), '-fmodule-output', '-c', source, '-o', target])
+
+    def compile_many(self, batch):
+        # clang++ refuses -o with several inputs and writes each object into the working directory instead
+        sources = [os.path.abspath(self.object_paths(node)[0]) for node in batch]
+        cwd = os.path.join(self.dirs['object'], os.path.dirname(batch[0].filename))
+        # Spell __FILE__ relative to the project and record the project as the debug compilation dir,
+        # as the singleton compiles do
+        root = os.getcwd()
+        build_dirs = ['-fmacro-prefix-map=' + os.path.join(root, '') + '=', '-fdebug-compilation-dir=' + root]
+        self.run(self.cmd_prefix + self.extra_flags(batch[0]) + build_dirs + ['-c'] + sources, cwd)
+
+    def is_batchable(self):
+        cxx = self.cxx[0]
+        if os.sep in cxx and not os.path.isabs(cxx):
+            return False
+
+        for flag in self.base_flags + self.type_flags:
+            if not flag.startswith('-'):
+                if not os.path.isabs(flag):
+                    return False
+                continue
+            for prefix in self.path_flags:
+                if flag.startswith(prefix):
+                    value = flag[len(prefix):].removeprefix('=')
+                    if value != '' and not os.path.isabs(value):
+                        return False
+        return True
+
+    def extra_flags(self, node):
+        if node not in self.node_flags:
+            collected = []
+            self.collect_modules(node, collected)
+            self.node_flags[node] = [self.header_unit_flags[header] for header in node.header_units] + collected
+        return self.node_flags[node]
+
+    def collect_modules(self, root, collected):
+        stack = [root]
+        while len(stack) > 0:
+            node = stack.pop()
+            if node.type in [Type.module, Type.module_partition]:
+                if node not in self.module_flags:
+                    bmi_path = os.path.join(self.dirs['object'], node.bmi_name)
+                    self.module_flags[node] = f'-fmodule-file={node.module}={os.path.abspath(bmi_path)}'
+                collected += [self.module_flags[node]]
+            stack.extend(reversed(node.children))
 
     def link(self, target):
         if self.compiles > 0:
@@ -173,88 +331,98 @@ class Baker:
             if not self.show:
                 eprint(f'> Linking {target}...', end='', flush=True)
             begin = time.time()
-            self.run(self.cxx + self.base_flags + self.type_flags + collected + ['-o', target_path])
+            self.run(self.cmd_prefix + collected + ['-o', target_path])
             elapsed = time.time() - begin
             if not self.show:
                 eprint('\r', end='')
             eprint('> Linked', target, 'in', f'{elapsed:.2e}s ')
 
-    def collect_objects(self, node, collected):
-        collected += [self.removesuffixes(['.cpp', '.cppm'],
-                                          os.path.join(self.dirs['object'], node.data['filename'])) + '.o']
-        for child in node.children:
-            self.collect_objects(child, collected)
-
-    def removesuffixes(self, suffixes, path):
-        for suffix in suffixes:
-            path = path.removesuffix(suffix)
-        return path
-
-    def is_later(self, path, path2):
-        return os.path.getmtime(path) > os.path.getmtime(path2)
+    def collect_objects(self, root, collected):
+        stack = [root]
+        while len(stack) > 0:
+            node = stack.pop()
+            collected += [os.path.join(self.dirs['object'], node.object_name)]
+            stack.extend(reversed(node.children))
 
     def make_header_units(self):
-        for header in self.header_units:
-            bmi_path = os.path.join(self.dirs['header_units'], header.replace('/', '-')) + '.pcm'
-            if not os.path.exists(bmi_path):
-                if not self.show:
-                    eprint(f'> Precompiling header {header}...', end='', flush=True)
-                begin = time.time()
-                self.run(self.cxx + self.base_flags + self.type_flags +
-                         ['-Wno-pragma-system-header-outside-header', '--precompile', '-xc++-system-header',
-                          header, '-o', bmi_path])
-                if not self.show:
-                    eprint('\r', end='')
-                elapsed = time.time() - begin
-                eprint('> Precompiled header', header, 'in', f'{elapsed:.2e}s')
+        missing = [header for header in self.header_units if not self.exists(self.header_unit_path(header))]
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            futures = [executor.submit(self.precompile_header, header) for header in missing]
+            for future in concurrent.futures.as_completed(futures):
+                if future.exception() is not None:
+                    for pending in futures:
+                        pending.cancel()
+                    raise future.exception()
+
+        self.header_unit_flags = {header: '-fmodule-file=' + os.path.abspath(self.header_unit_path(header))
+                                  for header in self.header_units}
+
+    def precompile_header(self, header):
+        begin = time.time()
+        self.run(self.cmd_prefix +
+                 ['-Wno-pragma-system-header-outside-header', '--precompile', '-xc++-system-header',
+                  header, '-o', self.header_unit_path(header)])
+        elapsed = time.time() - begin
+        eprint('> Precompiled header', header, 'in', f'{elapsed:.2e}s')
+
+    def header_unit_path(self, header):
+        return os.path.join(self.dirs['header_units'], header.replace('/', '-')) + '.pcm'
 
     def build_compile_tree(self):
         self.clip_redundant(self.root_node)
         self.fix_module_partition_deps(self.root_node)
 
-    def fix_module_partition_deps(self, node):
-        for child in node.children:
-            if node.data['type'] == Type.module and child.data['type'] == Type.module_partition:
-                c_node = self.classes[Type.module][node.data['module']]
-                c_partition_node = self.classes[Type.module_partition][child.data['module']]
-                c_node.data['post'] += c_partition_node.data['post']
-
-            self.fix_module_partition_deps(child)
-
-    def clip_redundant(self, node):
-        while True:
-            any = False
-            for index, child in enumerate(node.children):
-                if id(child.parent) != id(node):
-                    del node.children[index]
-                    any = True
-                    break
-            if not any:
-                break
-
-        for child in node.children:
-            self.clip_redundant(child)
-
-    def walk(self, node, depth):
-        type_name = node.data['type'].name
+    def fix_module_partition_deps(self, root):
+        stack = [root]
+        while len(stack) > 0:
+            node = stack.pop()
+            for child in node.children:
+                if node.type == Type.module and child.type == Type.module_partition:
+                    c_node = self.classes[Type.module][node.module]
+                    c_partition_node = self.classes[Type.module_partition][child.module]
+                    c_node.post += c_partition_node.post
+                stack.append(child)
+
+    def clip_redundant(self, root):
+        worklist = collections.deque([root])
+        while len(worklist) > 0:
+            node = worklist.popleft()
+            node.children = [child for child in node.children if child.parent is node]
+            worklist.extend(node.children)
+
+    def walk(self, root):
+        self.print_node(root, 0)
+        # Each entry is a node and the index of its next child to visit, so the stack depth is the tree depth
+        stack = [(root, 0)]
+        while len(stack) > 0:
+            node, index = stack.pop()
+            if index < len(node.children):
+                stack.append((node, index + 1))
+                child = node.children[index]
+                self.print_node(child, len(stack))
+                stack.append((child, 0))
+
+    def print_node(self, node, depth):
+        type_name = node.type.name
         id_str = f'0x{id(node):x}'
         parent_id_str = f'0x{id(node.parent):x}' if node.parent is not None else 'None'
         print(f'Depth: {depth}, id: {id_str}, parent id: {parent_id_str}, type: {type_name}'
-              + (f' ({node.data["module"]})' if type_name.startswith('module') else '')
-              + f', source: {node.data["filename"]}')
-        for child in node.children:
-            self.walk(child, depth+1)
+              + (f' ({node.module})' if type_name.startswith('module') else '')
+              + f', source: {node.filename}')
 
     def build_dependency_tree(self):
         self.attach_plain_sources()
         self.attach_module_impls()
-        self.node_depth = {}
-        self.last_node_depth = -1
-        self.fill_children(self.root_node, 0)
+        self.fill_children(self.root_node)
+        self.in_degree = {}
+        self.dependencies = {}
+        self.dependents = {}
+        self.fill_dependents(self.root_node)
 
     def attach_plain_sources(self):
         for index, plain in enumerate(self.classes[Type.plain]):
-            if id(plain) != id(self.root_node):
+            if plain is not self.root_node:
                 self.root_node.children += ['@' + str(index)]
 
     def attach_module_impls(self):
@@ -262,11 +430,32 @@ class Baker:
             for index in range(len(self.classes[Type.module_impl][key])):
                 self.root_node.children += ['%' + key + ',' + str(index)]
 
-    def fill_children(self, node, depth):
-        if depth > self.last_node_depth:
-            self.last_node_depth = depth
-            self.last_node = node
-        module = node.data['module']
+    def fill_children(self, root):
+        self.resolve_children(root)
+        # Each entry is a node and the index of its next child to visit, so the stack holds the current import path
+        stack = [(root, 0)]
+        on_path = {root}
+
+        while len(stack) > 0:
+            node, index = stack.pop()
+            if index == len(node.children):
+                on_path.discard(node)
+                continue
+            stack.append((node, index + 1))
+
+            child = node.children[index]
+            if child in on_path:
+                raise RuntimeError(f'Import cycle through {child.filename}')
+            depth = len(stack) - 1
+            if depth > child.depth:
+                child.depth = depth
+                child.parent = node
+            self.resolve_children(child)
+            on_path.add(child)
+            stack.append((child, 0))
+
+    def resolve_children(self, node):
+        module = node.module
 
         for index, child in enumerate(node.children):
             if type(child) == Node:
@@ -292,23 +481,57 @@ class Baker:
             else:
                 raise RuntimeError(f'No module named {module} is known. Did you forget to include its source?')
 
-        for index in range(len(node.children)):
-            child = node.children[index]
-            if (child not in self.node_depth) or (depth > self.node_depth[child]):
-                self.node_depth[child] = depth
-                node.children[index].parent = node
-            self.fill_children(node.children[index], depth+1)
+    def fill_dependents(self, root):
+        self.dependents[root] = []
+        stack = [root]
+
+        while len(stack) > 0:
+            node = stack.pop()
+            if node in self.in_degree:
+                continue
+            self.in_degree[node] = len(node.children)
+            self.dependencies[node] = node.children.copy()
+
+            for child in node.children:
+                self.dependents.setdefault(child, []).append(node)
+                stack.append(child)
 
     def make_directories(self):
+        # The build, object and header unit directories come from the Bakerfile and may be nested
         os.makedirs(self.dirs['build'], exist_ok=True)
         os.makedirs(self.dirs['object'], exist_ok=True)
-        for dir in self.primary_dirs:
-            os.makedirs(os.path.join(self.dirs['object'], dir), exist_ok=True)
         os.makedirs(self.dirs['header_units'], exist_ok=True)
 
+        dirs = {self.dirs['object'], self.dirs['header_units']}
+        for dir in self.primary_dirs:
+            # Primary directories are exactly one level below the object directory
+            path = os.path.join(self.dirs['object'], dir)
+            try:
+                os.mkdir(path)
+            except FileExistsError:
+                pass
+            dirs.add(path)
+
+        # One listing per directory answers the existence checks for every object, BMI and header unit within
+        self.dir_index = {}
+        for dir in dirs:
+            with os.scandir(dir) as entries:
+                self.dir_index[os.path.normpath(dir)] = {entry.name for entry in entries}
+
+    def exists(self, path):
+        dir, name = os.path.split(path)
+        return name in self.dir_index[os.path.normpath(dir)]
+
     def gen_classes(self, sources):
+        # Restored even on errors, otherwise the caches saved at exit would land inside the source directory
+        cwd = os.getcwd()
         os.chdir(self.options['dirs']['source'])
+        try:
+            self.classify_sources(sources)
+        finally:
+            os.chdir(cwd)
 
+    def classify_sources(self, sources):
         self.classes = {
             Type.plain: set(),
             Type.module: {},
@@ -316,18 +539,17 @@ class Baker:
             Type.module_impl: {}
         }
         self.header_units = set()
-        self.primary_dirs = set()
 
-        for index, source in enumerate(sources):
-            if not (source.endswith('.cpp') or source.endswith('.cppm')):
+        parsed = [(source, os.path.dirname(source)) for source in sources]
+        for source, primary_dir in parsed:
+            if not source.endswith(('.cpp', '.cppm')):
                 raise ValueError('Only .cpp and .cppm files are permitted as the values of targets')
-
-            primary_dir = os.path.dirname(source)
             if '/' in primary_dir or primary_dir == '':
                 raise ValueError(f'Must have strictly one level of directory for every source: {source}')
-            self.primary_dirs.add(primary_dir)
+        self.primary_dirs = {primary_dir for _, primary_dir in parsed}
 
-            data = classify(source)
+        for index, source in enumerate(sources):
+            data = self.classify(source)
 
             self.header_units.update(data['header_units'])
             children = data['post'].copy()
@@ -354,7 +576,138 @@ class Baker:
 
         self.classes[Type.plain] = list(self.classes[Type.plain])
 
-        os.chdir('..')
+    def load_caches(self):
+        self.hash_cache = self.load_cache('hash_cache.json')
+        self.compile_times = self.load_cache('compile_times.json')
+        self.classify_cache = self.load_cache('classify_cache.json')
+        atexit.register(self.save_caches)
+
+    def load_cache(self, name):
+        path = os.path.join(self.dirs['build'], name)
+        if not os.path.exists(path):
+            return {}
+        with open(path) as cache:
+            try:
+                data = json.load(cache)
+            except ValueError: # Also covers invalid UTF-8, not only malformed JSON
+                return {}
+        return data if type(data) == dict else {}
+
+    def save_caches(self):
+        os.makedirs(self.dirs['build'], exist_ok=True)
+        for name, cache in [('hash_cache.json', self.hash_cache), ('compile_times.json', self.compile_times),
+                            ('classify_cache.json', self.classify_cache)]:
+            # Written aside and renamed over, so an interrupted write never leaves a truncated cache behind
+            path = os.path.join(self.dirs['build'], name)
+            with open(path + '.tmp', 'w') as file:
+                json.dump(cache, file)
+            os.replace(path + '.tmp', path)
+
+    graph_fields = ['classes', 'root_node', 'header_units', 'primary_dirs', 'in_degree', 'dependencies', 'dependents']
+    # Bump whenever what gets pickled changes shape in a way Node's slots don't show
+    graph_format = 2
+
+    def load_graph(self, target, sources):
+        digest = hashlib.blake2b()
+        digest.update(f'{self.graph_format}:{Node.__slots__}:{self.graph_fields}\n'.encode())
+        for source in sources:
+            info = os.stat(os.path.join(self.options['dirs']['source'], source))
+            digest.update(f'{source}:{info.st_size}:{info.st_mtime_ns}\n'.encode())
+        self.graph_signature = digest.hexdigest()
+
+        path = os.path.join(self.dirs['build'], target + '.graph.pkl')
+        if not os.path.exists(path):
+            return False
+        with open(path, 'rb') as file:
+            try:
+                graph = pickle.load(file)
+            except Exception:
+                # A damaged pickle can fail in many ways (bad opcodes, undecodable strings, ...), all meaning a miss
+                return False
+        if type(graph) != dict or graph.get('signature') != self.graph_signature:
+            return False
+        if any(field not in graph for field in self.graph_fields + ['nodes']):
+            return False
+
+        try:
+            self.unflatten_graph(graph)
+        except Exception:
+            return False
+        return True
+
+    def save_graph(self, target):
+        # Taken before build_compile_tree, which clips the children in place
+        graph = self.flatten_graph()
+        graph['signature'] = self.graph_signature
+        os.makedirs(self.dirs['build'], exist_ok=True)
+        path = os.path.join(self.dirs['build'], target + '.graph.pkl')
+        with open(path + '.tmp', 'wb') as file:
+            pickle.dump(graph, file)
+        os.replace(path + '.tmp', path)
+
+    def flatten_graph(self):
+        # Nodes are stored in a list and referenced by index, since pickling the parent/children
+        # links directly recurses once per node and overflows on long import chains
+        nodes = list(self.classes[Type.plain]) + list(self.classes[Type.module].values()) \
+            + list(self.classes[Type.module_partition].values())
+        for impls in self.classes[Type.module_impl].values():
+            nodes += impls
+        index = {node: i for i, node in enumerate(nodes)}
+
+        return {
+            'nodes': [(node.data, node.depth, index[node.parent] if node.parent is not None else None,
+                       [index[child] if type(child) == Node else child for child in node.children])
+                      for node in nodes],
+            'classes': {
+                Type.plain: [index[node] for node in self.classes[Type.plain]],
+                Type.module: {key: index[node] for key, node in self.classes[Type.module].items()},
+                Type.module_partition: {key: index[node] for key, node in self.classes[Type.module_partition].items()},
+                Type.module_impl: {key: [index[node] for node in impls]
+                                   for key, impls in self.classes[Type.module_impl].items()}
+            },
+            'root_node': index[self.root_node],
+            'header_units': self.header_units,
+            'primary_dirs': self.primary_dirs,
+            'in_degree': {index[node]: degree for node, degree in self.in_degree.items()},
+            'dependencies': {index[node]: [index[other] for other in others] for node, others in self.dependencies.items()},
+            'dependents': {index[node]: [index[other] for other in others] for node, others in self.dependents.items()},
+        }
+
+    def unflatten_graph(self, graph):
+        nodes = [Node(None, [], **data) for data, _, _, _ in graph['nodes']]
+        for node, (_, depth, parent, children) in zip(nodes, graph['nodes']):
+            node.depth = depth
+            node.parent = nodes[parent] if parent is not None else None
+            node.children = [nodes[child] if type(child) == int else child for child in children]
+
+        classes = graph['classes']
+        self.classes = {
+            Type.plain: [nodes[i] for i in classes[Type.plain]],
+            Type.module: {key: nodes[i] for key, i in classes[Type.module].items()},
+            Type.module_partition: {key: nodes[i] for key, i in classes[Type.module_partition].items()},
+            Type.module_impl: {key: [nodes[i] for i in impls] for key, impls in classes[Type.module_impl].items()}
+        }
+        self.root_node = nodes[graph['root_node']]
+        self.header_units = graph['header_units']
+        self.primary_dirs = graph['primary_dirs']
+        self.in_degree = {nodes[i]: degree for i, degree in graph['in_degree'].items()}
+        self.dependencies = {nodes[i]: [nodes[j] for j in others] for i, others in graph['dependencies'].items()}
+        self.dependents = {nodes[i]: [nodes[j] for j in others] for i, others in graph['dependents'].items()}
+
+    def classify(self, source):
+        info = os.stat(source)
+        key = f'{info.st_size}:{info.st_mtime_ns}'
+        entry = self.classify_cache.get(source)
+
+        if entry is None or entry['key'] != key:
+            data = classify(source)
+            entry = {'key': key, 'data': dict(data, type=data['type'].name)}
+            self.classify_cache[source] = entry
+
+        # Copied since the node's lists get extended later on, e.g. by fix_module_partition_deps
+        data = {name: value.copy() if type(value) == list else value for name, value in entry['data'].items()}
+        data['type'] = Type[data['type']]
+        return data
 
     def load_bakerfile(self):
         if not os.path.exists('Bakerfile.json'):
@@ -367,6 +720,16 @@ class Baker:
             if 'targets' not in options:
                 raise ValueError('Must specify targets')
 
+            targets = options['targets']
+            if type(targets) != dict:
+                raise ValueError(f'Targets must be a dict: {targets}')
+            for target in targets:
+                sources = targets[target]
+                if type(sources) != list or any(type(source) != str for source in sources):
+                    raise ValueError(f'Source of each target must be a list (of strings): {targets}')
+                if len(sources) == 0:
+                    raise ValueError(f'Target {target} must have at least one source')
+
             for key in self.options_default:
                 if key in options:
                     self.options[key] = {}
@@ -416,6 +779,16 @@ class Baker:
         self.dirs['header_units'] = os.path.join(self.dirs['build'], self.options['dirs']['header_units'])
 
         self.cxx = [self.options['options']['cxx']]
+        self.cmd_prefix = self.cxx + self.base_flags + self.type_flags
+        self.batchable = self.is_batchable()
+
+        if 'jobs' in self.args:
+            jobs = self.args['jobs'][0]
+            if not jobs.isdecimal() or int(jobs) < 1:
+                raise ValueError(f'jobs must be a positive integer: {jobs}')
+            self.jobs = int(jobs)
+        else:
+            self.jobs = os.cpu_count() or 1
 
     def parse_args(self):
         i = 1
@@ -433,10 +806,11 @@ class Baker:
                 raise ValueError(f'Unknown argument: {current}')
             i += 1
 
-    def run(self, args):
+    def run(self, args, cwd=None):
         if self.show:
-            eprint(' '.join(args))
-        status = subprocess.run(args)
+            eprint((f'cd {cwd} && ' if cwd is not None else '') + ' '.join(args))
+        # An explicit executable path and close_fds=False let subprocess use posix_spawn instead of fork + exec
+        status = subprocess.run(args, executable=find_executable(args[0]), close_fds=False, cwd=cwd)
         if status.returncode != 0:
             raise RuntimeError(f'Last command abnormally exited with code {status.returncode}')
 
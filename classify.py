@@ -4,14 +4,14 @@ import re
 
 from utility import Type
 
-re_impl = r'^module\s+(.+)$'
-re_export = r'^export\s+module\s+(.+)$'
+re_impl = re.compile(r'^module\s+(.+)$')
+re_export = re.compile(r'^export\s+module\s+(.+)$')
 
-re_export_import = r'^export\s+import\s+(.+)$'
-re_import = r'^import\s+(.+)$'
-re_import_header_unit = r'^[<"]+.+[>"]+$'
+re_export_import = re.compile(r'^export\s+import\s+(.+)$')
+re_import = re.compile(r'^import\s+(.+)$')
+re_import_header_unit = re.compile(r'^[<"]+.+[>"]+$')
 
-re_okay = [r'^module$', r'^#.+$', r'^//.*$']
+re_okay = [re.compile(r'^module$'), re.compile(r'^#.+$'), re.compile(r'^//.*$')]
 
 def classify(filename):
     data = {'filename': filename, 'module': '', 'type': Type.plain, 'header_units': [], 'post': [], 'pre': []}
@@ -24,7 +24,7 @@ def classify(filename):
                 if len(stat) > 0:
                     assigned = False
 
-                    m_impl = re.search(re_impl, stat)
+                    m_impl = re_impl.search(stat)
                     if m_impl is not None:
                         assert(data['type'] == Type.plain)
                         data['type'] = Type.module_impl
@@ -33,7 +33,7 @@ def classify(filename):
                         assigned = True
 
                     if not assigned:
-                        m_export = re.search(re_export, stat)
+                        m_export = re_export.search(stat)
                         if m_export is not None:
                             assert(data['type'] == Type.plain)
                             is_partition = ':' in stat
@@ -42,7 +42,7 @@ def classify(filename):
                             assigned = True
 
                     if not assigned:
-                        m_export_import = re.search(re_export_import, stat)
+                        m_export_import = re_export_import.search(stat)
                         if m_export_import is not None:
                             value = m_export_import.groups()[0]
                             if value[0] == ':':
@@ -52,11 +52,11 @@ def classify(filename):
                             assigned = True
 
                     if not assigned:
-                        m_import = re.search(re_import, stat)
+                        m_import = re_import.search(stat)
                         if m_import is not None:
                             what = m_import.groups()[0]
 
-                            m_import_header_unit = re.search(re_import_header_unit, what)
+                            m_import_header_unit = re_import_header_unit.search(what)
                             if m_import_header_unit is not None:
                                 what = what.strip('<>"')
                                 data['header_units'] += [what]
@@ -72,7 +72,7 @@ def classify(filename):
                     if not assigned:
                         any = False
                         for regexp in re_okay:
-                            if re.search(regexp, stat) is not None:
+                            if regexp.search(stat) is not None:
                                 any = True
                                 break
                         if not any:
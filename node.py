@@ -1,22 +1,40 @@
-from utility import Type
+from utility import Type, strip_ext
 
 class Node:
+    __slots__ = ('parent', 'children', 'depth', 'filename', 'module', 'type', 'header_units', 'post', 'pre',
+                 'object_name', 'bmi_name')
+
     def __init__(self, parent, children, **kwargs):
-        self.data = kwargs
         self.parent = parent
         self.children = children
-        self.check()
+        self.depth = -1
+        self.check(kwargs)
+
+        self.filename = kwargs['filename']
+        self.module = kwargs['module']
+        self.type = kwargs['type']
+        self.header_units = kwargs.get('header_units', [])
+        self.post = kwargs.get('post', [])
+        self.pre = kwargs.get('pre', [])
+
+        self.object_name = strip_ext(self.filename) + '.o'
+        self.bmi_name = strip_ext(self.filename) + '.pcm'
 
-    def check(self):
+    @property
+    def data(self):
+        return {'filename': self.filename, 'module': self.module, 'type': self.type,
+                'header_units': self.header_units, 'post': self.post, 'pre': self.pre}
+
+    def check(self, data):
         for required in [('module', str), ('filename', str), ('type', Type)]:
-            if required[0] not in self.data:
-                raise KeyError(f'Required key {required[0]} not in the node\'s dictionary: {self.data}')
-            if type(self.data[required[0]]) != required[1]:
-                raise TypeError(f'Value must be of type {required[1]} for key {required[0]} in the node\'s dictionary: {self.data}')
+            if required[0] not in data:
+                raise KeyError(f'Required key {required[0]} not in the node\'s dictionary: {data}')
+            if type(data[required[0]]) != required[1]:
+                raise TypeError(f'Value must be of type {required[1]} for key {required[0]} in the node\'s dictionary: {data}')
 
         for child in self.children:
             if type(child) not in [Node, str]:
-                raise TypeError(f'Every child must be of type Node/str: {self.data}')
+                raise TypeError(f'Every child must be of type Node/str: {data}')
 
     def __repr__(self):
         s = f'<Node (0x{id(self):x}): parent: ' + (f'0x{id(self.parent):x}' if self.parent is not None else 'None')
@@ -34,4 +52,4 @@ class Node:
         s += self.data.__repr__()
         s += '>'
         return s
-        
+
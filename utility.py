@@ -1,3 +1,10 @@
 from enum import Enum
 
 Type = Enum('Type', ('plain', 'module', 'module_partition', 'module_impl'))
+
+def strip_ext(path):
+    if path.endswith('.cppm'):
+        return path[:-5]
+    if path.endswith('.cpp'):
+        return path[:-4]
+    return path